@@ -1,13 +1,62 @@
 """
 Tic Tac Toe Player
 """
-from copy import deepcopy
-from math import inf
 
 X = "X"
 O = "O"
 EMPTY = None
 
+# Bitboards hold one bit per cell, bit 3 * i + j for cell (i, j)
+FULL = 0o777
+WINS = (0o007, 0o070, 0o700,  # rows
+        0o111, 0o222, 0o444,  # columns
+        0o421, 0o124)         # diagonals
+
+# The 8 rotations and reflections of the board, as the cell each cell moves to
+CELL_SYMMETRIES = tuple(
+    tuple(3 * i + j for i, j in cells)
+    for cells in (
+        [(i, j) for i in range(3) for j in range(3)],
+        [(j, 2 - i) for i in range(3) for j in range(3)],
+        [(2 - i, 2 - j) for i in range(3) for j in range(3)],
+        [(2 - j, i) for i in range(3) for j in range(3)],
+        [(i, 2 - j) for i in range(3) for j in range(3)],
+        [(2 - i, j) for i in range(3) for j in range(3)],
+        [(j, i) for i in range(3) for j in range(3)],
+        [(2 - j, 2 - i) for i in range(3) for j in range(3)],
+    )
+)
+
+# The cell each cell comes from under the same symmetries
+INVERSE_SYMMETRIES = tuple(
+    tuple(cells.index(cell) for cell in range(9)) for cells in CELL_SYMMETRIES
+)
+
+# The same symmetries applied to every bitboard, indexed [symmetry][mask]
+MASK_SYMMETRIES = tuple(
+    tuple(sum(1 << cells[cell] for cell in range(9) if mask >> cell & 1)
+          for mask in range(FULL + 1))
+    for cells in CELL_SYMMETRIES
+)
+
+# Cells in the order moves are tried: center, then corners, then edges
+MOVE_ORDER = (4, 0, 2, 6, 8, 1, 3, 5, 7)
+
+# Bound on scores, which range from -1 to 1
+INF = 2
+
+# Value of a position where the game is not over yet
+ONGOING = 2
+
+# Bound types for transposition table entries
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# Alpha-beta results keyed by canonical(x, o), as (bound type, score, best
+# move's cell in the canonical position)
+transpositions = {}
+
 
 def initial_state():
     """
@@ -22,33 +71,18 @@ def player(board):
     """
     Returns player who has the next turn on a board.
     """
-    num_X = 0
-    num_O = 0
-
-    for row in board:
-        for el in row:
-            if el == X:
-                num_X += 1
-            if el == O:
-                num_O += 1
-
-    if num_X > num_O:
-        return O
-    else:
-        return X
+    flat = [el for row in board for el in row]
+    return O if flat.count(X) > flat.count(O) else X
 
 
 def actions(board):
     """
-    Returns set of all possible actions (i, j) available on the board.
+    Returns list of all possible actions (i, j) available on the board,
+    in the order the search tries them.
     """
-    possible_moves = set()
-
-    for i, row in enumerate(board):
-        for j, el in enumerate(row):
-            if el == EMPTY:
-                possible_moves.add((i, j))
-    return possible_moves
+    x, o = bitboards(board)
+    free = ~(x | o) & FULL
+    return [divmod(cell, 3) for cell in MOVE_ORDER if free >> cell & 1]
 
 
 def result(board, action):
@@ -57,9 +91,8 @@ def result(board, action):
     """
     if board[action[0]][action[1]] != EMPTY or action[0] > 2 or action[1] > 2:
         raise ValueError
-    new_board = deepcopy(board)
-    p = player(new_board)
-    new_board[action[0]][action[1]] = p
+    new_board = [row[:] for row in board]
+    new_board[action[0]][action[1]] = player(board)
     return new_board
 
 
@@ -67,15 +100,11 @@ def winner(board):
     """
     Returns the winner of the game, if there is one.
     """
-    for ind in range(len(board)):
-        if board[ind][0] == board[ind][1] and board[ind][0] == board[ind][2] and board[ind][0] != EMPTY:
-            return board[ind][0]
-        if board[0][ind] == board[1][ind] and board[2][ind] == board[0][ind] and board[0][ind] != EMPTY:
-            return board[0][ind]
-
-    if ((board[0][0] == board[1][1] == board[2][2]) or (board[0][2] == board[1][1] == board[2][0])) \
-            and board[1][1] != EMPTY:
-        return board[1][1]
+    x, o = bitboards(board)
+    if has_won(x):
+        return X
+    if has_won(o):
+        return O
     return None
 
 
@@ -83,59 +112,182 @@ def terminal(board):
     """
     Returns True if game is over, False otherwise.
     """
-    if all(el != EMPTY for row in board for el in row):
-        return True
-    if winner(board) is not None:
+    if not any(EMPTY in row for row in board):
         return True
-    return False
+    return winner(board) is not None
 
 
 def utility(board):
     """
     Returns 1 if X has won the game, -1 if O has won, 0 otherwise.
     """
-    if winner(board) == X:
+    w = winner(board)
+    return 1 if w == X else -1 if w == O else 0
+
+
+def bitboards(board):
+    """
+    Returns the (X, O) bitboards for the board.
+    """
+    x = 0
+    o = 0
+    for i, row in enumerate(board):
+        for j, el in enumerate(row):
+            if el == X:
+                x |= 1 << (3 * i + j)
+            elif el == O:
+                o |= 1 << (3 * i + j)
+    return x, o
+
+
+def has_won(mask):
+    """
+    Returns True if the bitboard covers a full row, column or diagonal.
+    """
+    for win in WINS:
+        if mask & win == win:
+            return True
+    return False
+
+
+def x_to_move(x, o):
+    """
+    Returns True if X moves next on bitboards x and o.
+    """
+    return bin(x | o).count("1") % 2 == 0
+
+
+def canonical(x, o):
+    """
+    Returns the smallest (x << 9) | o key over all symmetries of the
+    position, so that equivalent positions share a key, and the symmetry
+    that maps the position to it.
+    """
+    key = (x << 9) | o
+    symmetry = 0
+    for s in range(1, len(MASK_SYMMETRIES)):
+        image = (MASK_SYMMETRIES[s][x] << 9) | MASK_SYMMETRIES[s][o]
+        if image < key:
+            key = image
+            symmetry = s
+    return key, symmetry
+
+
+def ordered_moves(free, key, symmetry, table):
+    """
+    Returns the free cells in the order to search them: the best move
+    cached for the position first, then the rest in MOVE_ORDER.
+    """
+    cells = [cell for cell in MOVE_ORDER if free >> cell & 1]
+    if key in table:
+        best = INVERSE_SYMMETRIES[symmetry][table[key][2]]
+        cells.remove(best)
+        cells.insert(0, best)
+    return cells
+
+
+def terminal_value(x, o):
+    """
+    Returns 1 if X has won on bitboards x and o, -1 if O has won, 0 for a
+    tie, or ONGOING if the game is not over.
+    """
+    if has_won(x):
         return 1
-    if winner(board) == O:
+    if has_won(o):
         return -1
-    return 0
+    if x | o == FULL:
+        return 0
+    return ONGOING
 
 
-def find_score(board):
+def alphabeta(x, o, alpha, beta, maximizing, table):
     """
-    Returns the optimal action for the current player on the board.
+    Returns the minimax value of the position given by bitboards x and o,
+    pruning branches that fall outside the (alpha, beta) window.
+    The side to move is passed down as `maximizing` rather than recounted,
+    and results are cached in the transposition table `table`.
     """
-    if terminal(board):
-        return utility(board)
+    value = terminal_value(x, o)
+    if value != ONGOING:
+        return value
+
+    free = ~(x | o) & FULL
+    key, symmetry = canonical(x, o)
+    alpha_orig = alpha
+    beta_orig = beta
+    if key in table:
+        bound, score, _ = table[key]
+        if bound == EXACT:
+            return score
+        if bound == LOWER:
+            alpha = max(alpha, score)
+        else:
+            beta = min(beta, score)
+        if alpha >= beta:
+            return score
 
-    possible_moves = actions(board)
-    scores = []
-    for move in possible_moves:
-        new_board = result(board, move)
-        scores.append(find_score(new_board))
+    score = -INF if maximizing else INF
+    best_move = -1
+    for cell in ordered_moves(free, key, symmetry, table):
+        if maximizing:
+            child_score = alphabeta(x | 1 << cell, o, alpha, beta, False, table)
+            if child_score > score:
+                score = child_score
+                best_move = cell
+            alpha = max(alpha, score)
+        else:
+            child_score = alphabeta(x, o | 1 << cell, alpha, beta, True, table)
+            if child_score < score:
+                score = child_score
+                best_move = cell
+            beta = min(beta, score)
+        if alpha >= beta:
+            break
 
-    if player(board) == X:
-        return max(scores)
-    elif player(board) == O:
-        return min(scores)
+    if score <= alpha_orig:
+        bound = UPPER
+    elif score >= beta_orig:
+        bound = LOWER
+    else:
+        bound = EXACT
+    table[key] = (bound, score, CELL_SYMMETRIES[symmetry][best_move])
+    return score
 
 
 def minimax(board):
-    if terminal(board):
+    """
+    Returns the optimal action for the current player on the board.
+    """
+    x, o = bitboards(board)
+    if terminal_value(x, o) != ONGOING:
         return None
 
-    best_score = -inf
+    # Every opening move draws under optimal play, so skip the search
+    if not x | o:
+        return (0, 0)
+
+    maximizing = x_to_move(x, o)
+    alpha = -INF
+    beta = INF
     best_move = None
-    if player(board) == O:
-        best_score = inf
-        best_move = None
-
-    possible_moves = actions(board)
-    for move in possible_moves:
-        new_board = result(board, move)
-        score = find_score(new_board)
-        if (best_score < score and player(board) == X) or (best_score > score and player(board) == O):
-            best_score = score
-            best_move = move
-
-    return best_move
\ No newline at end of file
+    searched = set()
+
+    free = ~(x | o) & FULL
+    for cell in ordered_moves(free, *canonical(x, o), transpositions):
+        child = (x | 1 << cell, o) if maximizing else (x, o | 1 << cell)
+
+        # Skip moves that are a rotation or reflection of one already searched
+        key, _ = canonical(*child)
+        if key in searched:
+            continue
+        searched.add(key)
+
+        score = alphabeta(*child, alpha, beta, not maximizing, transpositions)
+        if maximizing and score > alpha:
+            alpha = score
+            best_move = cell
+        elif not maximizing and score < beta:
+            beta = score
+            best_move = cell
+
+    return divmod(best_move, 3)
@@ -0,0 +1,74 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+Compiled kernel for heredity.py, for pedigrees too large to enumerate with
+NumPy arrays.
+"""
+from libc.stdint cimport int64_t
+
+# Largest number of people whose sets fit in an int64 bitmask
+cdef enum:
+    MAX_PEOPLE = 62
+
+
+def joint_probabilities_all(const int64_t[:] mother_of, const int64_t[:] father_of,
+                            const int64_t[:] trait_masks,
+                            int low, int64_t one_gene_high, int64_t two_genes_high,
+                            const double[:, ::1] parent_factor,
+                            const double[:, :, :, ::1] child_factor,
+                            double[:, ::1] gene_totals, double[:, ::1] trait_totals):
+    """
+    Add the joint probability of every configuration to `gene_totals` and
+    `trait_totals`, indexed [person, n_genes] and [person, trait].
+
+    Configurations pair every gene assignment of the first `low` people,
+    with the rest having one gene if in bitmask `one_gene_high` and two if
+    in `two_genes_high`, with each bitmask of people with the trait in
+    `trait_masks`. Person i is bit i, and has parents `mother_of[i]` and
+    `father_of[i]`, or -1 for people without parents.
+    """
+    cdef Py_ssize_t n = mother_of.shape[0]
+    cdef Py_ssize_t i, k
+    cdef int64_t one_low, two_low, rest, one_gene, two_genes, have_trait, trait
+    cdef double p
+    cdef int genes[MAX_PEOPLE]
+    cdef double factor[MAX_PEOPLE][2]
+
+    if n > MAX_PEOPLE:
+        raise ValueError(f"at most {MAX_PEOPLE} people are supported")
+    if not 0 <= low <= n:
+        raise ValueError("low must be between 0 and the number of people")
+
+    cdef int64_t low_full = (<int64_t>1 << low) - 1
+
+    for one_low in range(low_full + 1):
+
+        # Visit each submask of the people without one gene exactly once
+        rest = low_full & ~one_low
+        two_low = rest
+        while True:
+            one_gene = one_low | one_gene_high
+            two_genes = two_low | two_genes_high
+
+            # Each person's local factor depends only on their trait here
+            for i in range(n):
+                genes[i] = ((one_gene >> i) & 1) + 2 * ((two_genes >> i) & 1)
+            for i in range(n):
+                for trait in range(2):
+                    if mother_of[i] < 0:
+                        factor[i][trait] = parent_factor[genes[i], trait]
+                    else:
+                        factor[i][trait] = child_factor[genes[i], genes[mother_of[i]],
+                                                        genes[father_of[i]], trait]
+
+            for k in range(trait_masks.shape[0]):
+                have_trait = trait_masks[k]
+                p = 1
+                for i in range(n):
+                    p *= factor[i][(have_trait >> i) & 1]
+                for i in range(n):
+                    gene_totals[i, genes[i]] += p
+                    trait_totals[i, (have_trait >> i) & 1] += p
+
+            if two_low == 0:
+                break
+            two_low = (two_low - 1) & rest
@@ -1,9 +1,17 @@
 import csv
-import itertools
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
 import numpy as np
 
+try:
+    # Compiled kernel, built with `python setup.py build_ext --inplace`
+    from _heredity import joint_probabilities_all
+except ImportError:
+    joint_probabilities_all = None
+
 PROBS = {
 
     # Unconditional probabilities for having gene
@@ -38,6 +46,33 @@ PROBS = {
     "mutation": 0.01
 }
 
+# Most array elements, gene assignments times trait assignments plus
+# people, handled in one piece; this bounds the NumPy kernel's memory and
+# sets the size of the work handed to each process
+CHUNK_SIZE = 1 << 21
+
+
+# PROBS as flat arrays: GENE_P[n_genes], TRAIT_P[n_genes, trait] and
+# PASS_P[n_genes], the probability that a parent passes the gene on
+GENE_P = np.array([PROBS["gene"][n] for n in range(3)])
+TRAIT_P = np.array([[PROBS["trait"][n][False], PROBS["trait"][n][True]] for n in range(3)])
+PASS_P = np.array([PROBS["mutation"], 0.5, 1 - PROBS["mutation"]])
+
+# Probability of a child's gene count, indexed [n_genes, n_genes_mother, n_genes_father]
+MOTHER_PASSES = PASS_P[:, np.newaxis]
+FATHER_PASSES = PASS_P[np.newaxis, :]
+INHERIT_P = np.array([
+    (1 - MOTHER_PASSES) * (1 - FATHER_PASSES),
+    (1 - MOTHER_PASSES) * FATHER_PASSES + MOTHER_PASSES * (1 - FATHER_PASSES),
+    MOTHER_PASSES * FATHER_PASSES
+])
+
+# Local factor of a person without parents, indexed [n_genes, trait]
+PARENT_FACTOR = GENE_P[:, np.newaxis] * TRAIT_P
+
+# Local factor of a child, indexed [n_genes, n_genes_mother, n_genes_father, trait]
+CHILD_FACTOR = INHERIT_P[:, :, :, np.newaxis] * TRAIT_P[:, np.newaxis, np.newaxis, :]
+
 
 def main():
     # Check for proper usage
@@ -60,25 +95,48 @@ def main():
         for person in people
     }
 
-    # Loop over all sets of people who might have the trait
-    names = set(people)
-    for have_trait in powerset(names):
-
-        # Check if current set of people violates known information
-        fails_evidence = any(
-            (people[person]["trait"] is not None and
-             people[person]["trait"] != (person in have_trait))
-            for person in names
-        )
-        if fails_evidence:
-            continue
-
-        # Loop over all sets of people who might have the gene
-        for one_gene in powerset(names):
-            for two_genes in powerset(names - one_gene):
-                # Update probabilities with new joint probability
-                p = joint_probability(people, one_gene, two_genes, have_trait)
-                update(probabilities, one_gene, two_genes, have_trait, p)
+    # Person i is bit i of every set of people, so sets are integer bitmasks
+    names = list(people)
+
+    # Index each person's parents once, with -1 for people without parents
+    index = {person: i for i, person in enumerate(names)}
+    mother_of = np.array([index.get(people[person]["mother"], -1) for person in names],
+                         dtype=np.int64)
+    father_of = np.array([index.get(people[person]["father"], -1) for person in names],
+                         dtype=np.int64)
+
+    # Only vary the trait of people whose trait is unknown, so every set of
+    # people with the trait agrees with known information
+    unknown = [i for i, person in enumerate(names) if people[person]["trait"] is None]
+    traits = np.zeros((1 << len(unknown), len(names)), dtype=int)
+    traits[:] = [people[person]["trait"] is True for person in names]
+    traits[:, unknown] = mask_bits(np.arange(1 << len(unknown)), len(unknown))
+
+    # Split gene assignments into chunks that fix the gene counts of the
+    # last people, enumerating the first `low` people within each chunk
+    low = len(names)
+    while low > 0 and 3 ** low * (len(traits) + len(names)) > CHUNK_SIZE:
+        low -= 1
+    one_gene_high, two_genes_high = disjoint_masks(range(low, len(names)))
+
+    # Sum joint probabilities by each person's gene count and trait,
+    # spreading chunks across processes when there is more than one
+    args = (repeat(mother_of), repeat(father_of), repeat(traits), repeat(low),
+            one_gene_high, two_genes_high)
+    if len(one_gene_high) == 1 or (os.cpu_count() or 1) == 1:
+        results = list(map(probability_totals, *args))
+    else:
+        with ProcessPoolExecutor() as executor:
+            results = list(executor.map(probability_totals, *args))
+    gene_totals = sum(gene_chunk for gene_chunk, _ in results)
+    trait_totals = sum(trait_chunk for _, trait_chunk in results)
+
+    # Update probabilities with the totals
+    for i, person in enumerate(names):
+        for n_genes in range(3):
+            probabilities[person]["gene"][n_genes] += gene_totals[i, n_genes]
+        probabilities[person]["trait"][True] += trait_totals[i, 1]
+        probabilities[person]["trait"][False] += trait_totals[i, 0]
 
     # Ensure probabilities sum to 1
     normalize(probabilities)
@@ -115,81 +173,91 @@ def load_data(filename):
     return data
 
 
-def powerset(s):
+def mask_bits(masks, n):
+    """
+    Return the bits of each bitmask in `masks` as a row of `n` 0/1 columns.
+    """
+    return (masks[:, np.newaxis] >> np.arange(n)) & 1
+
+
+def disjoint_masks(people_idx):
     """
-    Return a list of all possible subsets of set s.
+    Return arrays `one_gene` and `two_genes` of bitmasks pairing up every
+    disjoint set of the people in `people_idx` with one and two genes.
     """
-    s = list(s)
-    return [
-        set(s) for s in itertools.chain.from_iterable(
-            itertools.combinations(s, r) for r in range(len(s) + 1)
-        )
-    ]
+    # Give each person in turn no gene, one gene or two genes
+    one_gene = np.zeros(1, dtype=np.int64)
+    two_genes = np.zeros(1, dtype=np.int64)
+    for i in people_idx:
+        one_gene = np.concatenate([one_gene, one_gene | 1 << i, one_gene])
+        two_genes = np.concatenate([two_genes, two_genes, two_genes | 1 << i])
+    return one_gene, two_genes
 
 
-def joint_probability(people, one_gene, two_genes, have_trait):
+def probability_totals(mother_of, father_of, traits, low, one_gene_high, two_genes_high):
     """
-    Compute and return a joint probability.
-
-    The probability returned should be the probability that
-        * everyone in set `one_gene` has one copy of the gene, and
-        * everyone in set `two_genes` has two copies of the gene, and
-        * everyone not in `one_gene` or `two_gene` does not have the gene, and
-        * everyone in set `have_trait` has the trait, and
-        * everyone not in set` have_trait` does not have the trait.
+    Return joint probabilities summed by each person's gene count and trait,
+    as arrays indexed [person, n_genes] and [person, trait].
+
+    Sums run over every gene assignment of the first `low` people, with the
+    rest having one gene if in bitmask `one_gene_high` and two if in
+    `two_genes_high`, and each trait assignment in `traits`, one row per
+    assignment with column i giving the trait of person i. Person i has
+    parents `mother_of[i]` and `father_of[i]`, or -1 for people without
+    parents.
     """
-    parents = []
-    children = []
-    for human in people.keys():
-        if people[human]['mother'] is None:
-            parents.append(human)
-        else:
-            children.append(human)
-
-    parents_joint = 1
-
-    for parent in parents:
-        n_genes = 1 * (parent in one_gene) + 2 * (parent in two_genes)
-        trait = (parent in have_trait)
-
-        parents_joint *= PROBS['gene'][n_genes] * PROBS['trait'][n_genes][trait]
-
-    children_joint = 1
-    for child in children:
-        mother = people[child]['mother']
-        father = people[child]['father']
-
-        n_genes = 1 * (child in one_gene) + 2 * (child in two_genes)
-        n_genes_mother = 1 * (mother in one_gene) + 2 * (mother in two_genes)
-        n_genes_father = 1 * (father in one_gene) + 2 * (father in two_genes)
-        trait = (child in have_trait)
-        mother_effect = PROBS['mutation'] * (n_genes_mother == 0) + 0.5 * (n_genes_mother == 1) + (1 - PROBS['mutation']) * (n_genes_mother == 2)
-        father_effect = PROBS['mutation'] * (n_genes_father == 0) + 0.5 * (n_genes_father == 1) + (1 - PROBS['mutation']) * (n_genes_father == 2)
-        if n_genes == 0:
-            children_joint *= (1 - mother_effect) * (1 - father_effect)
-        elif n_genes == 1:
-            children_joint *= (1 - mother_effect) * father_effect + mother_effect * (1 - father_effect)
-        else:
-            children_joint *= mother_effect * father_effect
-
-        children_joint *= PROBS['trait'][n_genes][trait]
-    total_joint = parents_joint * children_joint
-
-    return total_joint
-
-
-def update(probabilities, one_gene, two_genes, have_trait, p):
+    n = len(mother_of)
+    gene_totals = np.zeros((n, 3))
+    trait_totals = np.zeros((n, 2))
+
+    if joint_probabilities_all is not None:
+        trait_masks = (traits @ (1 << np.arange(n))).astype(np.int64)
+        joint_probabilities_all(mother_of, father_of, trait_masks,
+                                low, one_gene_high, two_genes_high,
+                                PARENT_FACTOR, CHILD_FACTOR, gene_totals, trait_totals)
+        return gene_totals, trait_totals
+
+    one_gene, two_genes = disjoint_masks(range(low))
+    genes = (mask_bits(one_gene | one_gene_high, n) +
+             2 * mask_bits(two_genes | two_genes_high, n))
+
+    parent_idx = [i for i in range(n) if mother_of[i] == -1]
+    child_idx = [i for i in range(n) if mother_of[i] != -1]
+    joint_probability(gene_totals, trait_totals, parent_idx, child_idx,
+                      mother_of, father_of, genes, traits)
+    return gene_totals, trait_totals
+
+
+def joint_probability(gene_totals, trait_totals, parent_idx, child_idx,
+                      mother_of, father_of, genes, traits):
     """
-    Add to `probabilities` a new joint probability `p`.
-    Each person should have their "gene" and "trait" distributions updated.
-    Which value for each distribution is updated depends on whether
-    the person is in `have_gene` and `have_trait`, respectively.
+    Compute joint probabilities for many assignments at once and add them
+    to `gene_totals` and `trait_totals`.
+
+    `genes` has one row per gene assignment and `traits` one row per trait
+    assignment, with column i giving the gene count (0, 1 or 2) or trait
+    (0 or 1) of person i. For each pair of rows, the probability that
+    everyone has those gene counts and traits is added to
+    `gene_totals[i, n_genes]` and `trait_totals[i, trait]` for every person.
+
+    People without parents are listed by index in `parent_idx` and the rest
+    in `child_idx`, whose parents' indices are given by `mother_of` and
+    `father_of`.
     """
-    for human in probabilities:
-        n_genes = 1 * (human in one_gene) + 2 * (human in two_genes)
-        trait = (human in have_trait)
-        probabilities[human]['gene'][n_genes] += p
-        probabilities[human]['trait'][trait] += p
+    total_joint = np.ones((len(genes), len(traits)))
+    for i in parent_idx:
+        total_joint *= PARENT_FACTOR[genes[:, i, np.newaxis], traits[:, i]]
+    for i in child_idx:
+        total_joint *= CHILD_FACTOR[
+            genes[:, i, np.newaxis],
+            genes[:, mother_of[i], np.newaxis],
+            genes[:, father_of[i], np.newaxis],
+            traits[:, i]
+        ]
+
+    people_idx = np.arange(len(gene_totals))
+    np.add.at(gene_totals, (people_idx, genes), total_joint.sum(axis=1)[:, np.newaxis])
+    np.add.at(trait_totals, (people_idx, traits), total_joint.sum(axis=0)[:, np.newaxis])
 
     return
 
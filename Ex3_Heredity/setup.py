@@ -0,0 +1,8 @@
+from setuptools import setup
+from Cython.Build import cythonize
+
+# Build the compiled kernel in place with `python setup.py build_ext --inplace`
+setup(
+    name="heredity",
+    ext_modules=cythonize("_heredity.pyx"),
+)